@@ -1,21 +1,57 @@
-from fastapi import FastAPI
-from pathlib import Path
-import json
-from ecfr.metrics import today_metrics
+from fastapi import FastAPI, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from functools import lru_cache
+import orjson, pyarrow as pa
+from ecfr.metrics import get_snap, snap_mtime_ns, today_metrics
 
-SNAP_PATH = Path(__file__).resolve().parents[2] / "data" / "snapshot.json"
-SNAP      = json.loads(SNAP_PATH.read_text()) if SNAP_PATH.exists() else {}
+@lru_cache(maxsize=2)
+def _checksum_bytes(mtime_ns: int | None) -> dict[str, bytes]:
+    """Ready-to-send /checksum bodies for every agency in the snapshot."""
+    return {
+        ag: orjson.dumps({"agency": ag, "checksum": v.get("checksum")})
+        for ag, v in get_snap().items()
+    }
 
-app = FastAPI(title="eCFR‑micro")
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+@lru_cache(maxsize=2)
+def _metrics_frame(mtime_ns: int | None):
+    return today_metrics()
+
+@lru_cache(maxsize=2)
+def _metrics_bytes(mtime_ns: int | None) -> bytes:
+    return orjson.dumps(_metrics_frame(mtime_ns).to_dict(orient="records"))
+
+@lru_cache(maxsize=2)
+def _metrics_arrow(mtime_ns: int | None) -> bytes:
+    """/metrics as an Arrow IPC stream: numeric columns ship as raw bytes."""
+    table = pa.Table.from_pandas(_metrics_frame(mtime_ns), preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+app = FastAPI(title="eCFR‑micro", default_response_class=ORJSONResponse)
+# Agency names repeat across every payload and compress well; tiny bodies
+# such as /checksum are left alone.
+app.add_middleware(GZipMiddleware, minimum_size=500)
 
 @app.get("/agencies")
 def agencies():
-    return list(SNAP)
+    return list(get_snap())
 
 @app.get("/metrics")
-def metrics():
-    return today_metrics().to_dict(orient="records")
+def metrics(request: Request):
+    # JSON unless the client asks for Arrow (the Streamlit UI does).
+    vary = {"Vary": "Accept"}
+    if ARROW_STREAM in request.headers.get("accept", ""):
+        return Response(_metrics_arrow(snap_mtime_ns()), media_type=ARROW_STREAM, headers=vary)
+    return Response(_metrics_bytes(snap_mtime_ns()), media_type="application/json", headers=vary)
 
 @app.get("/checksum/{agency}")
 def checksum(agency: str):
-    return {"agency": agency, "checksum": SNAP.get(agency, {}).get("checksum")}
\ No newline at end of file
+    body = _checksum_bytes(snap_mtime_ns()).get(agency)
+    if body is None:
+        body = orjson.dumps({"agency": agency, "checksum": None})
+    return Response(body, media_type="application/json")
\ No newline at end of file
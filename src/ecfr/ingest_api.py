@@ -5,24 +5,73 @@ from __future__ import annotations
 * Concurrency capped to 5; exponential back‑off on 429.
 """
 
-import argparse, asyncio, hashlib, json, random, re, sys
+import argparse, asyncio, atexit, functools, hashlib, io, operator, random, re, sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, timedelta
 from pathlib import Path
 
 import aiohttp
+import orjson
 from aiohttp import ClientResponseError
 from lxml import etree
 
-WORD = re.compile(r"\w+")
+from ecfr.wordcount import count_words
+
+try:  # optional: faster event loop (not available on Windows)
+    import uvloop
+except ImportError:
+    uvloop = None
+
 OUTDIR = Path(__file__).resolve().parents[2] / "data"
 OUTDIR.mkdir(exist_ok=True)
+CACHE_PATH = OUTDIR / "parse_cache.json"
+CACHE_VERSION = 5  # bump whenever parse_metrics output or the cache layout changes
 
 TITLE_LIST_URL = "https://www.ecfr.gov/api/versioner/v1/titles"
 FULL_XML_URL = "https://www.ecfr.gov/api/versioner/v1/full/{d}/title-{t}.xml"
 HEADERS = {"User-Agent": "ecfr-micro/0.6"}
+# Accept-Encoding is left to aiohttp: it already asks for gzip/deflate (and br
+# when Brotli is installed) and decompresses transparently.
+XML_HEADERS = {**HEADERS, "Accept": "application/xml"}
 MAX_RETRIES = 4
 CONCURRENCY = 2 
 BACKOFF_BASE = 1.5  # seconds
+READ_CHUNK = 1 << 16  # bytes
+# One host, one pool: keep TLS connections and DNS answers for the whole run.
+CONNECTOR_OPTS = dict(
+    limit=CONCURRENCY,
+    limit_per_host=CONCURRENCY,
+    keepalive_timeout=60,
+    ttl_dns_cache=300,
+    force_close=False,
+)
+
+# Used for both the agency checksum and the parse cache key. Kept to hashlib so
+# checksums are identical on every install.
+_digest = functools.partial(hashlib.blake2b, digest_size=16)
+
+# Gates the GET itself so queued titles don't spend their ClientTimeout waiting
+# for a pooled connection, and retry back-off doesn't hold a slot.
+_DOWNLOADS = asyncio.Semaphore(CONCURRENCY)
+
+# parse_metrics reads only element text and the AGENCY/TYPE attributes; skip
+# building what it never looks at. Entities keep lxml's default (internal only)
+# so no text is lost. Comments and PIs stay: removing them merges the text on
+# either side into one node and glues the words that touched them.
+PARSE_OPTS = dict(
+    collect_ids=False,
+    remove_blank_text=True,
+    huge_tree=True,
+)
+
+# Every text node under an element (the same nodes itertext() yields), fetched
+# in one lxml call as plain str.
+SECTION_TEXT = etree.XPath("descendant::text()", smart_strings=False)
+
+# str(title) → [_digest(xml).hexdigest(), parse_metrics(xml)]; loaded/saved by
+# main(). One entry per title: a new revision replaces the old one, and titles
+# not fetched this run (subset runs, transient failures) keep theirs.
+_CACHE: dict[str, list] = {}
 
 # ───────────────────────── helpers ─────────────────────────
 
@@ -42,21 +91,29 @@ def parse_metrics(xml: bytes):
     except Exception as e_decode:
         print(f"[parse_metrics] Error decoding XML for snippet logging: {e_decode}")
 
+    bucket = {}
+    n_sections = 0
+    # Stream DIV8 elements with TYPE="SECTION", freeing each one once counted so
+    # the tree never holds more than the section being read.
     try:
-        root = etree.fromstring(xml)
-        if root is None:
-            print("[parse_metrics] etree.fromstring returned None.")
-            return {}
+        for _, section in etree.iterparse(io.BytesIO(xml), events=("end",), tag="DIV8", **PARSE_OPTS):
+            if section.get("TYPE") != "SECTION":
+                continue
+            n_sections += 1
+            # Text nodes joined by a space, so no word spans an element boundary
+            # (tostring(method="text") would glue them together).
+            wc = count_words(" ".join(SECTION_TEXT(section)))
+            ag = agency(section)
+            bucket[ag] = bucket.get(ag, 0) + wc
+            section.clear(keep_tail=True)
+            while section.getprevious() is not None:
+                del section.getparent()[0]
     except etree.XMLSyntaxError as e:
         print(f"[parse_metrics] XMLSyntaxError: {e}")
         return {}
-    
-    bucket = {}
-    # Look for DIV8 elements with TYPE="SECTION"
-    sections = [el for el in root.iter("DIV8") if el.get("TYPE") == "SECTION"]
-    print(f"[parse_metrics] Found {len(sections)} DIV8 elements with TYPE='SECTION'.")
+    print(f"[parse_metrics] Found {n_sections} DIV8 elements with TYPE='SECTION'.")
 
-    if not sections:
+    if not n_sections:
         print("[parse_metrics] No DIV8 elements with TYPE='SECTION' found in XML.")
         # Save problematic XML for inspection if no relevant sections are found
         problem_xml_path = OUTDIR / "problematic_xml_no_div8_sections.xml"
@@ -68,11 +125,6 @@ def parse_metrics(xml: bytes):
             print(f"[parse_metrics] Could not save problematic XML: {e_save}")
         return {}
         
-    for section in sections:
-        ag = agency(section)
-        bucket.setdefault(ag, 0)
-        bucket[ag] += len(WORD.findall(" ".join(section.itertext())))
-    
     if not bucket:
         print("[parse_metrics] Bucket is empty after processing sections.")
         return {}
@@ -81,21 +133,39 @@ def parse_metrics(xml: bytes):
     return {
         ag: {
             "word_count": wc,
-            "checksum": hashlib.sha256(f"{ag}{wc}".encode()).hexdigest(),
+            "checksum": _digest(f"{ag}{wc}".encode()).hexdigest(),
         }
         for ag, wc in bucket.items()
     }
 
+def load_cache():
+    if not CACHE_PATH.exists():
+        return {}
+    try:
+        cached = orjson.loads(CACHE_PATH.read_bytes())
+    except (OSError, ValueError) as e:
+        print(f"[load_cache] Ignoring unreadable cache {CACHE_PATH}: {e}")
+        return {}
+    if cached.get("version") != CACHE_VERSION:
+        print(f"[load_cache] Discarding cache made by parser version {cached.get('version')}.")
+        return {}
+    return cached["entries"]
+
+def save_cache():
+    try:
+        CACHE_PATH.write_bytes(orjson.dumps({"version": CACHE_VERSION, "entries": _CACHE}))
+        print(f"[save_cache] {len(_CACHE)} parsed titles → {CACHE_PATH}")
+    except OSError as e:
+        print(f"[save_cache] Could not write cache {CACHE_PATH}: {e}")
+
 async def discover_titles(session):
     async with session.get(TITLE_LIST_URL, headers=HEADERS) as r:
         data = await r.json()
-    titles = []
-    for t in data["titles"]:
-        if not t.get("reserved"):
-            number = t["number"]
-            latest_issue_date = t.get("latest_issue_date")
-            titles.append((number, latest_issue_date))
-    return titles
+    # (number, latest_issue_date) for every non-reserved title, in one pass.
+    return tuple(
+        (t["number"], t.get("latest_issue_date"))
+        for t in data["titles"] if not t.get("reserved")
+    )
 
 # ───────────────────── fetch with retry ─────────────────────
 async def get_with_retry(session, url: str):
@@ -103,12 +173,17 @@ async def get_with_retry(session, url: str):
     for attempt in range(MAX_RETRIES + 1):
         print(f"[get_with_retry] Attempt {attempt + 1}/{MAX_RETRIES + 1} for {url}")
         try:
-            async with session.get(url, headers=HEADERS) as r:
+            async with _DOWNLOADS, session.get(url, headers=XML_HEADERS) as r:
                 print(f"[get_with_retry] Response status for {url}: {r.status}")
                 r.raise_for_status() # Will raise ClientResponseError for 4xx/5xx
-                content = await r.read()
+                # Hash while the body streams in so the cache key is ready with it.
+                digest, chunks = _digest(), []
+                async for chunk in r.content.iter_chunked(READ_CHUNK):
+                    digest.update(chunk)
+                    chunks.append(chunk)
+                content = b"".join(chunks)
                 print(f"[get_with_retry] Successfully read content for {url} (length: {len(content)})")
-                return content
+                return content, digest.hexdigest()
         except ClientResponseError as exc:
             print(f"[get_with_retry] ClientResponseError for {url}: Status {exc.status}, Message: {exc.message}")
             if exc.status == 429 and attempt < MAX_RETRIES:
@@ -143,43 +218,93 @@ async def get_with_retry(session, url: str):
     return None
 
 
-async def fetch_title(session, day: str, title: int):
+async def fetch_title(session, pool, day: str, title: int):
     url = FULL_XML_URL.format(d=day, t=f"{title:02d}")
     print(f"[fetch_title] Preparing to fetch title {title} for day {day} from URL: {url}")
-    raw = await get_with_retry(session, url)
+    fetched = await get_with_retry(session, url)
     
-    if raw is None:
+    if fetched is None:
         print(f"⚠️  [fetch_title] No raw data returned from get_with_retry for {url}. Likely skipped due to errors.")
         return {}
     
+    raw, key = fetched
+    cached = _CACHE.get(str(title))
+    if cached and cached[0] == key:
+        print(f"[fetch_title] Cache hit for {url} ({key}). Skipping parse.")
+        return cached[1]
+
     print(f"[fetch_title] Raw data received for {url}, length {len(raw)}. Attempting to parse.")
     try:
-        metrics = parse_metrics(raw)
+        # Parse in a worker process so other titles keep downloading/parsing.
+        metrics = await asyncio.get_running_loop().run_in_executor(pool, parse_metrics, raw)
         if not metrics:
             print(f"⚠️  [fetch_title] parse_metrics returned empty for {url}. Content might be non-XML or empty of SECTIONs.")
+        else:
+            _CACHE[str(title)] = [key, metrics]
         return metrics
     except Exception as e: # Catch-all for unexpected errors during parsing
         print(f"⚠️  [fetch_title] Unexpected error during parse_metrics for {url}: {type(e).__name__} - {e}")
         return {}
 
 
-async def ingest_for_date(session, day: str, titles): # titles is a list of title numbers
+async def ingest_for_date(session, pool, day: str, titles): # titles is a list of title numbers
     sem = asyncio.Semaphore(CONCURRENCY) 
     async def throttled(t_num): # t_num is just the title number
         async with sem:
-            return await fetch_title(session, day, t_num)
+            return await fetch_title(session, pool, day, t_num)
     
     pieces = await asyncio.gather(*(throttled(t_num) for t_num in titles))
-    combined = {}
-    for p in pieces:
-        if p: # Ensure p is not None or empty before updating
-            combined.update(p)
-    return combined
+    # Fold into a fresh dict: pieces may be entries of _CACHE, which must not be mutated.
+    return functools.reduce(operator.ior, pieces, {})
 
 
 # ───────────────────────── entrypoint ─────────────────────────
+async def ingest_title(s, pool, title: int, latest_issue_date_str):
+    if not latest_issue_date_str:
+        print(f"⚠️  No latest issue date found for title {title}, skipping.")
+        return {}
+
+    try:
+        latest_issue_date = date.fromisoformat(latest_issue_date_str)
+        day_str = latest_issue_date.isoformat()
+    except ValueError:
+        print(f"⚠️  Invalid date format for title {title}: {latest_issue_date_str}, skipping.")
+        return {}
+    
+    print(f"Requesting data for title {title} on its latest_issue_date: {day_str}")
+    
+    current_url_for_title = FULL_XML_URL.format(d=day_str, t=f"{title:02d}")
+    try:
+        title_metrics = await ingest_for_date(s, pool, day_str, [title]) # Pass title as a list
+        
+        if title_metrics:
+            print(f"✅ Collected {len(title_metrics)} agencies from {day_str} for title {title}")
+        else:
+            print(f"⏭️  {day_str} yielded no data for title {title} from {current_url_for_title}. fetch_title returned empty.")
+        return title_metrics
+    
+    except (aiohttp.client_exceptions.ClientPayloadError, asyncio.exceptions.TimeoutError, aiohttp.ServerDisconnectedError, asyncio.CancelledError) as e: # Added CancelledError
+        print(f"⚠️  Network, timeout, or cancellation exception for title {title} on {day_str} ({current_url_for_title}): {e}")
+        return {}
+    except ClientResponseError as e:
+        if e.status == 400 and "date is past the title's most recent issue date" in str(e):
+            match = re.search(r"date of (\d{4}-\d{2}-\d{2})", str(e))
+            if match:
+                issue_date_from_error = match.group(1)
+                print(f"⚠️  Skipping {title} for {day_str}. API error for {current_url_for_title} indicates most recent issue date is {issue_date_from_error}.")
+                return {}
+        print(f"⚠️  ClientResponseError for title {title} on {day_str} ({current_url_for_title}) with status {e.status}: {e}")
+        return {}
+    except Exception as e: 
+        print(f"⚠️  An unexpected error occurred for title {title} on {day_str} ({current_url_for_title}): {e}")
+        return {}
+
+
 async def main(cli_titles):
-    connector = aiohttp.TCPConnector(limit=CONCURRENCY) 
+    _CACHE.update(load_cache())
+    atexit.register(save_cache)
+
+    connector = aiohttp.TCPConnector(**CONNECTOR_OPTS)
     async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as s: # Increased to 300s
         
         all_titles_data = cli_titles or await discover_titles(s)
@@ -192,49 +317,21 @@ async def main(cli_titles):
         titles_to_process = all_titles_data # Process all titles
         print(f"Processing all {len(titles_to_process)} discovered titles.")
 
-        metrics = {}
-        for title, latest_issue_date_str in titles_to_process: 
-            if not latest_issue_date_str:
-                print(f"⚠️  No latest issue date found for title {title}, skipping.")
-                continue
-
-            try:
-                latest_issue_date = date.fromisoformat(latest_issue_date_str)
-                day_str = latest_issue_date.isoformat()
-            except ValueError:
-                print(f"⚠️  Invalid date format for title {title}: {latest_issue_date_str}, skipping.")
-                continue
-            
-            print(f"Requesting data for title {title} on its latest_issue_date: {day_str}")
-            
-            current_url_for_title = FULL_XML_URL.format(d=day_str, t=f"{title:02d}")
-            try:
-                title_metrics = await ingest_for_date(s, day_str, [title]) # Pass title as a list
-                
-                if title_metrics:
-                    print(f"✅ Collected {len(title_metrics)} agencies from {day_str} for title {title}")
-                    metrics.update(title_metrics)
-                else:
-                    print(f"⏭️  {day_str} yielded no data for title {title} from {current_url_for_title}. fetch_title returned empty.")
-            
-            except (aiohttp.client_exceptions.ClientPayloadError, asyncio.exceptions.TimeoutError, aiohttp.ServerDisconnectedError, asyncio.CancelledError) as e: # Added CancelledError
-                print(f"⚠️  Network, timeout, or cancellation exception for title {title} on {day_str} ({current_url_for_title}): {e}")
-                continue
-            except ClientResponseError as e:
-                if e.status == 400 and "date is past the title's most recent issue date" in str(e):
-                    match = re.search(r"date of (\d{4}-\d{2}-\d{2})", str(e))
-                    if match:
-                        issue_date_from_error = match.group(1)
-                        print(f"⚠️  Skipping {title} for {day_str}. API error for {current_url_for_title} indicates most recent issue date is {issue_date_from_error}.")
-                        continue
-                print(f"⚠️  ClientResponseError for title {title} on {day_str} ({current_url_for_title}) with status {e.status}: {e}")
-                continue
-            except Exception as e: 
-                print(f"⚠️  An unexpected error occurred for title {title} on {day_str} ({current_url_for_title}): {e}")
-                continue
+        # Titles run concurrently (downloads still capped by the connector) and
+        # their XML is parsed across cores; results merge in title order.
+        # ingest_title handles its own errors, so the group only aborts on interrupts.
+        with ProcessPoolExecutor() as pool:
+            async with asyncio.TaskGroup() as tg:
+                tasks = [
+                    tg.create_task(ingest_title(s, pool, title, latest_issue_date_str))
+                    for title, latest_issue_date_str in titles_to_process
+                ]
+        metrics = functools.reduce(operator.ior, (task.result() for task in tasks), {})
 
     if metrics:
-        OUTDIR.joinpath("snapshot.json").write_text(json.dumps(metrics, indent=2))
+        OUTDIR.joinpath("snapshot.json").write_bytes(
+            orjson.dumps(metrics, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS)
+        )
         print("📦 snapshot →", OUTDIR / "snapshot.json")
     else:
         print("No metrics collected. snapshot.json not written.")
@@ -256,7 +353,7 @@ if __name__ == "__main__":
             processed_cli_titles.append((title_num, today_date_str))
         print(f"Running with specified titles, using today ({today_date_str}) as latest_issue_date: {processed_cli_titles}")
     
-    asyncio.run(main(processed_cli_titles))
+    (uvloop.run if uvloop else asyncio.run)(main(processed_cli_titles))
 """Download *all current* CFR titles via the eCFR v1 API and write a per‑agency
 metric snapshot (`data/snapshot.json`).
 
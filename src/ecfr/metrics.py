@@ -1,44 +1,146 @@
 """Derive additional analytics from the latest snapshot."""
-import json, hashlib
+import io, os, hashlib, tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date, timedelta
 from pathlib import Path
-import pandas as pd, textstat, aiohttp, asyncio
+import numpy as np, pandas as pd, aiohttp, asyncio, orjson
 from lxml import etree
-import re
+from ecfr.wordcount import count_words
 
-SNAP_PATH = Path("data/snapshot.json")
-SNAP      = json.loads(SNAP_PATH.read_text()) if SNAP_PATH.exists() else {}
+SNAP_PATH = Path(__file__).resolve().parents[2] / "data" / "snapshot.json"
+_snap_cache = {"mtime": None, "data": {}}
+
+def snap_mtime_ns() -> int | None:
+    try:
+        return SNAP_PATH.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+def get_snap() -> dict:
+    """Parsed snapshot, re-read only when the file's mtime changes."""
+    m = snap_mtime_ns()
+    if m is None:
+        return {}
+    if m != _snap_cache["mtime"]:
+        _snap_cache.update(mtime=m, data=orjson.loads(SNAP_PATH.read_bytes()))
+    return _snap_cache["data"]
 
 # ---- helpers for optional history -----------------------------------------
-BASE   = "https://www.ecfr.gov/api/versioner/v1/full/{d}/title-{t}.xml"
-WORD   = re.compile(r"\w+")
+BASE   = "https://www.ecfr.gov/api/versioner/v1/full"
+# Downloads in flight at once: the ingest's budget, kept well inside eCFR's
+# 60 requests/minute guideline.
+HISTORY_CONCURRENCY = 2
+# Text nodes per count_words call in word_count_from_xml (a few KB of text).
+TEXT_BATCH = 256
 
 def word_count_from_xml(raw: bytes) -> int:
-    root = etree.fromstring(raw)
-    return len(WORD.findall(" ".join(root.itertext())))
+    # Stream instead of building the tree. A tail is only complete once the
+    # parent closes, so each element counts its own text plus its children's
+    # tails, then drops the children (keeping its tail for its parent). Every
+    # text node is counted once, as with " ".join(root.itertext()). Nodes are
+    # joined into section-sized batches, so count_words runs on a few KB at a
+    # time rather than paying its per-call cost on every short node.
+    n = 0
+    parts: list[str] = []
+    for _, el in etree.iterparse(io.BytesIO(raw), events=("end",)):
+        parts.append(el.text or "")
+        parts.extend(child.tail or "" for child in el)
+        el.clear(keep_tail=True)
+        if len(parts) >= TEXT_BATCH:
+            n += count_words(" ".join(parts))
+            parts.clear()
+    return n + count_words(" ".join(parts))
+
+# (day, title) → word count. Only the day being asked for is kept.
+_WC: dict[tuple[str, int], int] = {}
+# Parsing is CPU-bound, so it runs one title per core, off the event loop.
+_POOL: ProcessPoolExecutor | None = None
+
+def pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor()
+    return _POOL
+
+async def _fetch(s, url):
+    async with s.get(url) as r:
+        r.raise_for_status()  # a 429/404 body is not XML
+        return await r.read()
+
+async def _count(s, gate, url) -> int:
+    # Each title is parsed as soon as its own download lands, overlapping
+    # with the GETs still in flight; the gate only covers the download.
+    async with gate:
+        raw = await _fetch(s, url)
+    return await asyncio.get_running_loop().run_in_executor(pool(), word_count_from_xml, raw)
+
+def _save_wc(cache: Path, counts: dict[str, int]) -> None:
+    cache.parent.mkdir(exist_ok=True)
+    # A temp file of its own per writer, so concurrent processes never share or
+    # interleave one; os.replace means readers never see a half-written file.
+    with tempfile.NamedTemporaryFile(dir=cache.parent, prefix=cache.stem,
+                                     suffix=".tmp", delete=False) as f:
+        f.write(orjson.dumps(counts))
+    os.replace(f.name, cache)
+    for old in cache.parent.glob("wc_*.json"):
+        if old != cache:
+            old.unlink(missing_ok=True)  # only one day is ever asked for
 
 async def yesterday_wc(titles):
     y = (date.today() - timedelta(days=1)).isoformat()
-    async with aiohttp.ClientSession() as s:
-        xml_blobs = await asyncio.gather(*(
-            (await s.get(BASE.format(d=y, t=f"{t:02d}"))).read() for t in titles
-        ))
-    return sum(word_count_from_xml(b) for b in xml_blobs)
+    for key in [k for k in _WC if k[0] != y]:
+        del _WC[key]
+    missing = [t for t in titles if (y, t) not in _WC]
+    # Second tier: counts already computed today by any process.
+    cache = SNAP_PATH.parent / f"wc_{y}.json"
+    if missing and cache.exists():
+        try:
+            _WC.update(((y, int(t)), n) for t, n in orjson.loads(cache.read_bytes()).items())
+        except (OSError, ValueError):
+            pass  # unreadable: treat as a miss and rewrite it below
+        missing = [t for t in titles if (y, t) not in _WC]
+    if missing:
+        urls = [f"{BASE}/{y}/title-{t:02d}.xml" for t in missing]
+        # One session per call, closed with it: the pool is shared by every
+        # title fetched here, and repeat calls are served by _WC and the disk
+        # tier instead.
+        conn = aiohttp.TCPConnector(limit=HISTORY_CONCURRENCY, ttl_dns_cache=600)
+        gate = asyncio.Semaphore(HISTORY_CONCURRENCY)
+        async with aiohttp.ClientSession(connector=conn) as s:
+            # Every title runs to completion, so one failure (a 429, say)
+            # doesn't discard the counts the others produced.
+            results = await asyncio.gather(*[_count(s, gate, u) for u in urls],
+                                           return_exceptions=True)
+        _WC.update(((y, t), n) for t, n in zip(missing, results)
+                   if not isinstance(n, BaseException))
+        _save_wc(cache, {str(t): n for (d, t), n in _WC.items() if d == y})
+        for r in results:
+            if isinstance(r, BaseException):
+                raise r
+    return sum([_WC[y, t] for t in titles])
 # ---------------------------------------------------------------------------
 
-def flesch(ag):
-    wc = SNAP[ag]["word_count"]
-    # Fake prose by repeating "word" wc times – works for Flesch numerator/denominator ratio
-    return textstat.flesch_reading_ease("word " * wc)
-
-def rvi(now, prev):
-    return abs(now - prev) / max(prev, 1)
-
 def today_metrics(prev_wc=None):
-    rows = []
-    for ag, v in SNAP.items():
-        row = {"agency": ag, **v, "readability": flesch(ag)}
-        if prev_wc:
-            row["rvi"] = rvi(v["word_count"], prev_wc.get(ag, 0))
-        rows.append(row)
-    return pd.DataFrame(rows)
\ No newline at end of file
+    snap = get_snap()
+    if not snap:
+        return pd.DataFrame()
+    # Built column by column rather than from per-agency dicts and transposed.
+    # Columns are the snapshot's keys in first-seen order, as from_dict gave.
+    rows = snap.values()
+    keys = dict.fromkeys(k for r in rows for k in r)
+    df = pd.DataFrame({"agency": list(snap), **{k: [r.get(k) for r in rows] for k in keys}})
+    wc = df["word_count"].to_numpy()
+    # Readability: the prose is modelled as wc one-syllable words in a single
+    # sentence, so Flesch reading ease
+    # 206.835 − 1.015·(words/sentences) − 84.6·(syllables/words) is closed-form.
+    # Unrounded, and 0.0 for no words, as textstat scored empty text.
+    df["readability"] = np.where(wc > 0, 206.835 - 1.015 * wc - 84.6, 0.0)
+    if prev_wc:
+        # Regulatory Volatility Index: relative change against the previous count.
+        prev = df["agency"].map(prev_wc).fillna(0).to_numpy()
+        df["rvi"] = np.abs(wc - prev) / np.maximum(prev, 1)
+    # Counts fit a small unsigned type; floats stay float64 (float32 would only
+    # lose precision and print longer in JSON).
+    df["word_count"] = pd.to_numeric(df["word_count"], downcast="unsigned")
+    # Sorted once here; clients render rows in the order served.
+    return df.sort_values("word_count", ascending=False, ignore_index=True)
\ No newline at end of file
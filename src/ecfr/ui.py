@@ -1,14 +1,27 @@
-import streamlit as st, requests, pandas as pd
+import streamlit as st, httpx, pandas as pd, pyarrow as pa
 
 API = "http://localhost:8000"
 
 st.set_page_config(page_title="eCFR snapshot", layout="wide")
 
+@st.cache_resource
+def client() -> httpx.Client:
+    # One pooled client per app process, so reruns reuse the connection.
+    return httpx.Client(base_url=API, timeout=5)
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_metrics() -> pd.DataFrame:
+    # Arrow IPC: typed columns arrive as-is, no JSON parse or dtype inference.
+    r = client().get("/metrics", headers={"Accept": "application/vnd.apache.arrow.stream"})
+    r.raise_for_status()
+    return pa.ipc.open_stream(r.content).read_pandas()
+
 st.title("eCFR snapshot – today")
 
-df = pd.DataFrame(requests.get(f"{API}/metrics").json())
+df = load_metrics()
 
-st.dataframe(df.sort_values("word_count", ascending=False))
+# Rows arrive sorted by word_count (descending) from the API.
+st.dataframe(df)
 
 st.bar_chart(df.set_index("agency")["word_count"], height=400)
 
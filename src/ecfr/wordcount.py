@@ -0,0 +1,40 @@
+"""Word counting shared by the ingest and the history metrics.
+
+A word is a run of the bytes ``\\w`` matches under ``re.ASCII``. Text is
+counted as UTF-8; multi-byte sequences are all >= 0x80, so they never count
+as word bytes.
+"""
+try:  # JIT word counter (in the pixi env); falls back to bytes.translate/count
+    import numpy as np
+    from numba import njit
+except ImportError:
+    njit = None
+
+WORD_CHARS = b"0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz"
+
+if njit is not None:
+    _WORD_BYTES = np.zeros(256, np.uint8)
+    _WORD_BYTES[list(WORD_CHARS)] = 1
+
+    @njit(cache=True, nogil=True)
+    def _count_word_runs(buf, tbl):
+        # Branch-free: add 1 on every non-word -> word transition.
+        n = 0
+        in_word = 0
+        for b in buf:
+            w = tbl[b]
+            n += w & (in_word ^ 1)
+            in_word = w
+        return n
+
+    def count_words(text: str) -> int:
+        return int(_count_word_runs(np.frombuffer(text.encode(), np.uint8), _WORD_BYTES))
+else:
+    # Word bytes become "a", everything else a space; each word then starts
+    # at a " a" pair (or at the very beginning). Both passes run in C and,
+    # unlike re.findall or split(), allocate nothing per word.
+    _WORD_MASK = bytes(0x61 if b in WORD_CHARS else 0x20 for b in range(256))
+
+    def count_words(text: str) -> int:
+        buf = text.encode().translate(_WORD_MASK)
+        return buf.count(b" a") + buf.startswith(b"a")